@@ -1,16 +1,32 @@
 """Roborock map image parser."""
 
 import logging
+from enum import IntEnum
 
+import numpy as np
+import numpy.typing as npt
 from PIL import Image
 from PIL.Image import Image as ImageType
 from PIL.Image import Resampling
-from vacuum_map_parser_base.config.color import ColorsPalette, SupportedColor
+from vacuum_map_parser_base.config.color import Color, ColorsPalette, SupportedColor
 from vacuum_map_parser_base.config.image_config import ImageConfig
 
 _LOGGER = logging.getLogger(__name__)
 
 
+class RoborockPixelCategory(IntEnum):
+    """Roborock map pixel category."""
+
+    OUTSIDE = 0
+    WALL = 1
+    INSIDE = 2
+    SCAN = 3
+    GREY_WALL = 4
+    WALL_V2 = 5
+    ROOM = 6
+    UNKNOWN = 7
+
+
 class RoborockImageParser:
     """Roborock image parser."""
 
@@ -18,87 +34,148 @@ class RoborockImageParser:
     MAP_WALL = 0x01
     MAP_INSIDE = 0xFF
     MAP_SCAN = 0x07
+    MAX_ROOMS = 32
+    PIXEL_TYPE_CATEGORIES = {
+        MAP_OUTSIDE: RoborockPixelCategory.OUTSIDE,
+        MAP_WALL: RoborockPixelCategory.WALL,
+        MAP_INSIDE: RoborockPixelCategory.INSIDE,
+        MAP_SCAN: RoborockPixelCategory.SCAN,
+    }
+    OBSTACLE_CATEGORIES = {
+        0: RoborockPixelCategory.GREY_WALL,
+        1: RoborockPixelCategory.WALL_V2,
+        7: RoborockPixelCategory.ROOM,
+    }
+    CATEGORY_COLORS = {
+        RoborockPixelCategory.OUTSIDE: SupportedColor.MAP_OUTSIDE,
+        RoborockPixelCategory.WALL: SupportedColor.MAP_WALL,
+        RoborockPixelCategory.INSIDE: SupportedColor.MAP_INSIDE,
+        RoborockPixelCategory.SCAN: SupportedColor.SCAN,
+        RoborockPixelCategory.GREY_WALL: SupportedColor.GREY_WALL,
+        RoborockPixelCategory.WALL_V2: SupportedColor.MAP_WALL_V2,
+        RoborockPixelCategory.UNKNOWN: SupportedColor.UNKNOWN,
+    }
 
     def __init__(self, palette: ColorsPalette, image_config: ImageConfig):
         self._colors_palette = palette
         self._image_config = image_config
+        self._checkerboard: npt.NDArray[np.bool_] | None = None
+        self._categories_lut = np.array(
+            [RoborockImageParser._get_pixel_category(pixel_type) for pixel_type in range(256)], dtype=np.uint8
+        )
+        # room number of each pixel type, pixels outside of rooms are mapped to MAX_ROOMS
+        self._room_numbers_lut = np.where(
+            self._categories_lut == RoborockPixelCategory.ROOM,
+            np.arange(256, dtype=np.uint8) >> 3,
+            np.uint8(RoborockImageParser.MAX_ROOMS),
+        )
+        self._colors_lut = self._get_colors_lut()
+        self._carpet_color = RoborockImageParser._to_rgba(palette.cached_colors[SupportedColor.CARPETS])
 
     def parse(
-        self, raw_data: bytes, width: int, height: int, carpet_map: set[int] | None
+        self, raw_data: bytes | memoryview, width: int, height: int, carpet_map: npt.NDArray[np.bool_] | None
     ) -> tuple[ImageType | None, dict[int, tuple[int, int, int, int]]]:
-        rooms = {}
         scale = self._image_config.scale
-        cached_colors = self._colors_palette.cached_colors
-        cached_room_colors = self._colors_palette.cached_room_colors
         trim_left = int(self._image_config.trim.left * width / 100)
         trim_right = int(self._image_config.trim.right * width / 100)
         trim_top = int(self._image_config.trim.top * height / 100)
         trim_bottom = int(self._image_config.trim.bottom * height / 100)
         trimmed_height = height - trim_top - trim_bottom
         trimmed_width = width - trim_left - trim_right
-        trimmed_left_width = trim_left + width
-        image = Image.new("RGBA", (trimmed_width, trimmed_height))
         if width == 0 or height == 0:
             return None, {}
-        pixels = image.load()
-        for img_y in range(trimmed_height):
-            img_x_offset = trimmed_left_width * (img_y + trim_bottom)
-            for img_x in range(trimmed_width):
-                idx = img_x + img_x_offset
-                pixel_type = raw_data[idx]
-                x = img_x
-                y = trimmed_height - img_y - 1
-                if carpet_map is not None and idx in carpet_map and (x + y) % 2:
-                    pixels[x, y] = cached_colors[SupportedColor.CARPETS]
-                elif pixel_type == RoborockImageParser.MAP_OUTSIDE:
-                    pixels[x, y] = cached_colors[SupportedColor.MAP_OUTSIDE]
-                elif pixel_type == RoborockImageParser.MAP_WALL:
-                    pixels[x, y] = cached_colors[SupportedColor.MAP_WALL]
-                elif pixel_type == RoborockImageParser.MAP_INSIDE:
-                    pixels[x, y] = cached_colors[SupportedColor.MAP_INSIDE]
-                elif pixel_type == RoborockImageParser.MAP_SCAN:
-                    pixels[x, y] = cached_colors[SupportedColor.SCAN]
-                else:
-                    obstacle = pixel_type & 0x07
-                    if obstacle == 0:
-                        pixels[x, y] = cached_colors[SupportedColor.GREY_WALL]
-                    elif obstacle == 1:
-                        pixels[x, y] = cached_colors[SupportedColor.MAP_WALL_V2]
-                    elif obstacle == 7:
-                        room_number = RoborockImageParser._get_room_number(pixel_type)
-                        room_x = img_x + trim_left
-                        room_y = img_y + trim_bottom
-                        if room_number not in rooms:
-                            rooms[room_number] = (room_x, room_y, room_x, room_y)
-                        else:
-                            rooms[room_number] = (
-                                min(rooms[room_number][0], room_x),
-                                min(rooms[room_number][1], room_y),
-                                max(rooms[room_number][2], room_x),
-                                max(rooms[room_number][3], room_y),
-                            )
-                        try:
-                            pixels[x, y] = cached_room_colors[room_number]
-                        except KeyError:
-                            # Since rooms can go above the 16 we preprocess, we handle the key error here and add it to
-                            # our local version of the cache and the real cache.
-                            cached_room_colors[room_number] = self._colors_palette.get_room_color(room_number)
-                            pixels[x, y] = cached_room_colors[room_number]
-                    else:
-                        pixels[x, y] = cached_colors[SupportedColor.UNKNOWN]
-        if scale != 1 and width != 0 and height != 0:
+        pixel_types = np.frombuffer(raw_data, dtype=np.uint8, count=width * height).reshape(height, width)
+        pixel_types = pixel_types[trim_bottom : trim_bottom + trimmed_height, trim_left : trim_left + trimmed_width]
+        # Decode in separate linear sweeps: room numbers first, then colours, then the carpet overlay.
+        rooms = RoborockImageParser._get_rooms(self._room_numbers_lut[pixel_types], trim_left, trim_bottom)
+        # image rows are stored bottom-up
+        pixels = self._colors_lut[pixel_types[::-1]]
+        if carpet_map is not None and carpet_map.any():
+            carpet = RoborockImageParser._get_carpet(carpet_map, width, height)[
+                trim_bottom : trim_bottom + trimmed_height, trim_left : trim_left + trimmed_width
+            ][::-1]
+            pixels[carpet & self._get_checkerboard(trimmed_height, trimmed_width)] = self._carpet_color
+        if scale > 1 and float(scale).is_integer():
+            # nearest neighbour scaling by an integer factor only repeats pixels
+            pixels = pixels.repeat(int(scale), axis=0).repeat(int(scale), axis=1)
+            return RoborockImageParser._create_image(pixels), rooms
+        image = RoborockImageParser._create_image(pixels)
+        if scale != 1:
             image = image.resize((int(trimmed_width * scale), int(trimmed_height * scale)), resample=Resampling.NEAREST)
         return image, rooms
 
     @staticmethod
-    def get_room_at_pixel(raw_data: bytes, width: int, x: int, y: int) -> int | None:
+    def _get_rooms(
+        room_numbers: npt.NDArray[np.uint8], offset_x: int, offset_y: int
+    ) -> dict[int, tuple[int, int, int, int]]:
+        # Mark in a single sweep which rows and columns contain each room, bounds are the first and last of them.
+        height, width = room_numbers.shape
+        rows = np.zeros((height, RoborockImageParser.MAX_ROOMS + 1), dtype=bool)
+        columns = np.zeros((width, RoborockImageParser.MAX_ROOMS + 1), dtype=bool)
+        rows[np.arange(height)[:, np.newaxis], room_numbers] = True
+        columns[np.arange(width)[np.newaxis, :], room_numbers] = True
+        rooms = {}
+        for room_number in np.flatnonzero(rows[:, : RoborockImageParser.MAX_ROOMS].any(axis=0)).tolist():
+            room_rows = np.flatnonzero(rows[:, room_number])
+            room_columns = np.flatnonzero(columns[:, room_number])
+            rooms[room_number] = (
+                int(room_columns[0]) + offset_x,
+                int(room_rows[0]) + offset_y,
+                int(room_columns[-1]) + offset_x,
+                int(room_rows[-1]) + offset_y,
+            )
+        return rooms
+
+    @staticmethod
+    def _create_image(pixels: npt.NDArray[np.uint8]) -> ImageType:
+        # pixels are a contiguous RGBA array, so the image can wrap it without conversion
+        height, width = pixels.shape[:2]
+        return Image.frombuffer("RGBA", (width, height), pixels, "raw", "RGBA", 0, 1)
+
+    @staticmethod
+    def _get_carpet(carpet_map: npt.NDArray[np.bool_], width: int, height: int) -> npt.NDArray[np.bool_]:
+        # carpet map holds one byte per image pixel, other sizes are padded or truncated to the image size
+        if carpet_map.size != width * height:
+            _LOGGER.debug("Carpet map size %d does not match image size %dx%d", carpet_map.size, width, height)
+            resized = np.zeros(width * height, dtype=bool)
+            resized[: carpet_map.size] = carpet_map[: width * height]
+            carpet_map = resized
+        return carpet_map.reshape(height, width)
+
+    def _get_checkerboard(self, height: int, width: int) -> npt.NDArray[np.bool_]:
+        if self._checkerboard is None or self._checkerboard.shape != (height, width):
+            self._checkerboard = np.add.outer(np.arange(height), np.arange(width)) % 2 == 1
+        return self._checkerboard
+
+    def _get_colors_lut(self) -> npt.NDArray[np.uint8]:
+        cached_colors = self._colors_palette.cached_colors
+        lut = np.empty((256, 4), dtype=np.uint8)
+        for pixel_type, category in enumerate(self._categories_lut.tolist()):
+            if category == RoborockPixelCategory.ROOM:
+                # palette caches room colors itself, including rooms above the predefined ones
+                color = self._colors_palette.get_room_color(pixel_type >> 3)
+            else:
+                color = cached_colors[RoborockImageParser.CATEGORY_COLORS[RoborockPixelCategory(category)]]
+            lut[pixel_type] = RoborockImageParser._to_rgba(color)
+        return lut
+
+    @staticmethod
+    def get_room_at_pixel(raw_data: bytes | memoryview, width: int, x: int, y: int) -> int | None:
         room_number = None
         pixel_type = raw_data[x + width * y]
         if pixel_type not in [RoborockImageParser.MAP_INSIDE, RoborockImageParser.MAP_SCAN]:
             if pixel_type & 0x07 == 7:
-                room_number = RoborockImageParser._get_room_number(pixel_type)
+                room_number = pixel_type >> 3
         return room_number
 
     @staticmethod
-    def _get_room_number(pixel_type: int) -> int:
-        return (pixel_type & 0xFF) >> 3
+    def _get_pixel_category(pixel_type: int) -> RoborockPixelCategory:
+        if pixel_type in RoborockImageParser.PIXEL_TYPE_CATEGORIES:
+            return RoborockImageParser.PIXEL_TYPE_CATEGORIES[pixel_type]
+        return RoborockImageParser.OBSTACLE_CATEGORIES.get(pixel_type & 0x07, RoborockPixelCategory.UNKNOWN)
+
+    @staticmethod
+    def _to_rgba(color: Color) -> tuple[int, int, int, int]:
+        if len(color) == 3:
+            return color[0], color[1], color[2], 255
+        return color[0], color[1], color[2], color[3]
@@ -1,10 +1,15 @@
 """Roborock map parser."""
 
+import functools
 import gzip
+import itertools
 import logging
+import struct
 from enum import Enum
 from typing import Any
 
+import numpy as np
+import numpy.typing as npt
 from vacuum_map_parser_base.config.color import ColorsPalette
 from vacuum_map_parser_base.config.drawable import Drawable
 from vacuum_map_parser_base.config.image_config import ImageConfig
@@ -75,6 +80,14 @@ class RoborockMapDataParser(MapDataParser):
         50: "pet",
         51: "fabric/paper balls",
     }
+    # header length, major version, minor version, map index, map sequence
+    MAP_HEADER = struct.Struct("<2xH4xHHII")
+    # block type, header length, data length
+    BLOCK_HEADER = struct.Struct("<HHI")
+    # top, left, height, width at the end of an image block header
+    IMAGE_HEADER = struct.Struct("<IIII")
+    # data length, point length, point size, angle
+    PATH_HEADER = struct.Struct("<4xIIII")
 
     def __init__(
         self,
@@ -92,25 +105,29 @@ class RoborockMapDataParser(MapDataParser):
 
     def parse(self, raw: bytes, *args: Any, **kwargs: Any) -> MapData:
         map_data = MapData(25500, 1000)
-        map_header_length = RoborockMapDataParser._get_int16(raw, 0x02)
-        map_data.additional_parameters["major_version"] = RoborockMapDataParser._get_int16(raw, 0x08)
-        map_data.additional_parameters["minor_version"] = RoborockMapDataParser._get_int16(raw, 0x0A)
-        map_data.additional_parameters["map_index"] = RoborockMapDataParser._get_int32(raw, 0x0C)
-        map_data.additional_parameters["map_sequence"] = RoborockMapDataParser._get_int32(raw, 0x10)
+        (
+            map_header_length,
+            map_data.additional_parameters["major_version"],
+            map_data.additional_parameters["minor_version"],
+            map_data.additional_parameters["map_index"],
+            map_data.additional_parameters["map_sequence"],
+        ) = RoborockMapDataParser.MAP_HEADER.unpack_from(raw, 0)
+        view = memoryview(raw)
         block_start_position = map_header_length
         img_start: int | None = None
         img_data = None
         img_data_length = None
         img_header_length = None
         img_header = None
+        carpet_map: npt.NDArray[np.bool_] | None = None
 
         while block_start_position < len(raw):
-            block_header_length = RoborockMapDataParser._get_int16(raw, block_start_position + 0x02)
-            header = RoborockMapDataParser._get_bytes(raw, block_start_position, block_header_length)
-            block_type = RoborockMapDataParser._get_int16(header, 0x00)
-            block_data_length = RoborockMapDataParser._get_int32(header, 0x04)
+            block_type, block_header_length, block_data_length = RoborockMapDataParser.BLOCK_HEADER.unpack_from(
+                raw, block_start_position
+            )
+            header = RoborockMapDataParser._get_view(view, block_start_position, block_header_length)
             block_data_start = block_start_position + block_header_length
-            data = RoborockMapDataParser._get_bytes(raw, block_data_start, block_data_length)
+            data = RoborockMapDataParser._get_view(view, block_data_start, block_data_length)
 
             match block_type:
                 case RoborockBlockType.CHARGER.value:
@@ -124,11 +141,11 @@ class RoborockMapDataParser(MapDataParser):
                 case RoborockBlockType.ROBOT_POSITION.value:
                     map_data.vacuum_position = RoborockMapDataParser._parse_object_position(block_data_length, data)
                 case RoborockBlockType.PATH.value:
-                    map_data.path = RoborockMapDataParser._parse_path(block_start_position, header, raw)
+                    map_data.path = RoborockMapDataParser._parse_path(block_start_position, header, view)
                 case RoborockBlockType.GOTO_PATH.value:
-                    map_data.goto_path = RoborockMapDataParser._parse_path(block_start_position, header, raw)
+                    map_data.goto_path = RoborockMapDataParser._parse_path(block_start_position, header, view)
                 case RoborockBlockType.GOTO_PREDICTED_PATH.value:
-                    map_data.predicted_path = RoborockMapDataParser._parse_path(block_start_position, header, raw)
+                    map_data.predicted_path = RoborockMapDataParser._parse_path(block_start_position, header, view)
                 case RoborockBlockType.CURRENTLY_CLEANED_ZONES.value:
                     map_data.zones = RoborockMapDataParser._parse_zones(data, header)
                 case RoborockBlockType.GOTO_TARGET.value:
@@ -153,14 +170,13 @@ class RoborockMapDataParser(MapDataParser):
                     block_pairs = RoborockMapDataParser._get_int16(header, 0x08)
                     map_data.blocks = RoborockMapDataParser._get_bytes(data, 0, block_pairs)
                 case RoborockBlockType.MOP_PATH.value:
-                    points_mask = RoborockMapDataParser._get_bytes(raw, block_data_start, block_data_length)
                     # only the map_data.path points where points_mask == 1 are in mop_path
                     if map_data.path is not None:
-                        map_data.mop_path = RoborockMapDataParser._parse_mop_path(map_data.path, points_mask)
+                        map_data.mop_path = RoborockMapDataParser._parse_mop_path(map_data.path, data)
                 case RoborockBlockType.CARPET_MAP.value:
-                    data = RoborockMapDataParser._get_bytes(raw, block_data_start, block_data_length)
                     # only the indexes where value == 1 are in carpet_map
-                    map_data.carpet_map = RoborockMapDataParser._parse_carpet_map(data)
+                    carpet_map = RoborockMapDataParser._parse_carpet_map(data)
+                    map_data.carpet_map = set(np.flatnonzero(carpet_map).tolist())
                 case RoborockBlockType.NO_CARPET_AREAS.value:
                     map_data.no_carpet_areas = RoborockMapDataParser._parse_area(header, data)
                 case _:
@@ -171,7 +187,7 @@ class RoborockMapDataParser(MapDataParser):
                         block_data_length,
                     )
 
-            block_start_position = block_start_position + block_data_length + RoborockMapDataParser._get_int8(header, 2)
+            block_start_position = block_start_position + block_data_length + (block_header_length & 0xFF)
 
         if (
             img_data is not None
@@ -185,7 +201,7 @@ class RoborockMapDataParser(MapDataParser):
                 img_header_length,
                 img_data,
                 img_header,
-                map_data.carpet_map,
+                carpet_map,
             )
             map_data.image = image
             map_data.rooms = rooms
@@ -199,7 +215,7 @@ class RoborockMapDataParser(MapDataParser):
                 and img_start is not None
             ):
                 map_data.vacuum_room = RoborockMapDataParser._get_current_vacuum_room(
-                    img_start, raw, map_data.vacuum_position
+                    img_start, view, map_data.vacuum_position
                 )
         return map_data
 
@@ -215,15 +231,14 @@ class RoborockMapDataParser(MapDataParser):
         self,
         block_data_length: int,
         block_header_length: int,
-        data: bytes,
-        header: bytes,
-        carpet_map: set[int] | None,
+        data: memoryview,
+        header: memoryview,
+        carpet_map: npt.NDArray[np.bool_] | None,
     ) -> tuple[ImageData, dict[int, Room]]:
         image_size = block_data_length
-        image_top = RoborockMapDataParser._get_int32(header, block_header_length - 16)
-        image_left = RoborockMapDataParser._get_int32(header, block_header_length - 12)
-        image_height = RoborockMapDataParser._get_int32(header, block_header_length - 8)
-        image_width = RoborockMapDataParser._get_int32(header, block_header_length - 4)
+        image_top, image_left, image_height, image_width = RoborockMapDataParser.IMAGE_HEADER.unpack_from(
+            header, block_header_length - 16
+        )
         image, rooms_raw = self._image_parser.parse(data, image_width, image_height, carpet_map)
         if image is None:
             image = self._image_generator.create_empty_map_image()
@@ -251,36 +266,31 @@ class RoborockMapDataParser(MapDataParser):
         )
 
     @staticmethod
-    def _get_current_vacuum_room(block_start_position: int, raw: bytes, vacuum_position: Point) -> int | None:
-        block_header_length = RoborockMapDataParser._get_int16(raw, block_start_position + 0x02)
-        header = RoborockMapDataParser._get_bytes(raw, block_start_position, block_header_length)
-        block_data_length = RoborockMapDataParser._get_int32(header, 0x04)
+    def _get_current_vacuum_room(block_start_position: int, raw: memoryview, vacuum_position: Point) -> int | None:
+        _, block_header_length, block_data_length = RoborockMapDataParser.BLOCK_HEADER.unpack_from(
+            raw, block_start_position
+        )
         block_data_start = block_start_position + block_header_length
-        data = RoborockMapDataParser._get_bytes(raw, block_data_start, block_data_length)
-        image_top = RoborockMapDataParser._get_int32(header, block_header_length - 16)
-        image_left = RoborockMapDataParser._get_int32(header, block_header_length - 12)
-        image_width = RoborockMapDataParser._get_int32(header, block_header_length - 4)
+        data = RoborockMapDataParser._get_view(raw, block_data_start, block_data_length)
+        image_top, image_left, _, image_width = RoborockMapDataParser.IMAGE_HEADER.unpack_from(
+            raw, block_data_start - 16
+        )
         p = RoborockMapDataParser._map_to_image(vacuum_position)
         room = RoborockImageParser.get_room_at_pixel(data, image_width, round(p.x - image_left), round(p.y - image_top))
         return room
 
     @staticmethod
-    def _parse_carpet_map(data: bytes) -> set[int]:
-        carpet_map = set()
-
-        for i, v in enumerate(data):
-            if v:
-                carpet_map.add(i)
-        return carpet_map
+    def _parse_carpet_map(data: memoryview) -> npt.NDArray[np.bool_]:
+        return np.frombuffer(data, dtype=np.uint8).astype(bool)
 
     @staticmethod
-    def _parse_goto_target(data: bytes) -> Point:
+    def _parse_goto_target(data: memoryview) -> Point:
         x = RoborockMapDataParser._get_int16(data, 0x00)
         y = RoborockMapDataParser._get_int16(data, 0x02)
         return Point(x, y)
 
     @staticmethod
-    def _parse_object_position(block_data_length: int, data: bytes) -> Point:
+    def _parse_object_position(block_data_length: int, data: memoryview) -> Point:
         x = RoborockMapDataParser._get_int32(data, 0x00)
         y = RoborockMapDataParser._get_int32(data, 0x04)
         a = None
@@ -291,119 +301,104 @@ class RoborockMapDataParser(MapDataParser):
         return Point(x, y, a)
 
     @staticmethod
-    def _parse_walls(data: bytes, header: bytes) -> list[Wall]:
+    def _parse_walls(data: memoryview, header: memoryview) -> list[Wall]:
         wall_pairs = RoborockMapDataParser._get_int16(header, 0x08)
-        walls = []
-        for wall_start in range(0, wall_pairs * 8, 8):
-            x0 = RoborockMapDataParser._get_int16(data, wall_start + 0)
-            y0 = RoborockMapDataParser._get_int16(data, wall_start + 2)
-            x1 = RoborockMapDataParser._get_int16(data, wall_start + 4)
-            y1 = RoborockMapDataParser._get_int16(data, wall_start + 6)
-            walls.append(Wall(x0, y0, x1, y1))
-        return walls
+        coordinates = np.frombuffer(data, dtype="<u2", count=wall_pairs * 4).reshape(-1, 4)
+        return list(itertools.starmap(Wall, coordinates.tolist()))
 
     @staticmethod
-    def _parse_obstacles(data: bytes, header: bytes) -> list[Obstacle]:
+    def _parse_obstacles(data: memoryview, header: memoryview) -> list[Obstacle]:
         obstacle_pairs = RoborockMapDataParser._get_int16(header, 0x08)
         obstacles: list[Obstacle] = []
         if obstacle_pairs == 0:
             return obstacles
         obstacle_size = int(len(data) / obstacle_pairs)
-        for obstacle_start in range(0, obstacle_pairs * obstacle_size, obstacle_size):
-            x = RoborockMapDataParser._get_int16(data, obstacle_start + 0)
-            y = RoborockMapDataParser._get_int16(data, obstacle_start + 2)
+        obstacle_dtype = RoborockMapDataParser._get_obstacle_dtype(obstacle_size)
+        for record in np.frombuffer(data, dtype=obstacle_dtype, count=obstacle_pairs).tolist():
             details = ObstacleDetails()
             if obstacle_size >= 6:
-                details.type = RoborockMapDataParser._get_int16(data, obstacle_start + 4)
+                details.type = record[2]
                 if details.type in RoborockMapDataParser.KNOWN_OBSTACLE_TYPES:
                     details.description = RoborockMapDataParser.KNOWN_OBSTACLE_TYPES[details.type]
                 if obstacle_size >= 10:
-                    u1 = RoborockMapDataParser._get_int16(data, obstacle_start + 6)
-                    u2 = RoborockMapDataParser._get_int16(data, obstacle_start + 8)
+                    u1 = record[3]
+                    u2 = record[4]
                     details.confidence_level = 0 if u2 == 0 else u1 * 10.0 / u2
-                    if obstacle_size == 28 and (data[obstacle_start + 12] & 0xFF) > 0:
-                        txt = RoborockMapDataParser._get_bytes(data, obstacle_start + 12, 16)
-                        details.photo_name = txt.decode("ascii")
-            obstacles.append(Obstacle(x, y, details))
+                    if obstacle_size == 28 and record[5][0] > 0:
+                        details.photo_name = record[5].decode("ascii")
+            obstacles.append(Obstacle(record[0], record[1], details))
         return obstacles
 
     @staticmethod
-    def _parse_zones(data: bytes, header: bytes) -> list[Zone]:
+    @functools.cache
+    def _get_obstacle_dtype(obstacle_size: int) -> np.dtype[np.void]:
+        # x, y, type, u1, u2 and photo name, the fields present depend on the record size
+        if obstacle_size == 28:
+            fields = 6
+        elif obstacle_size >= 10:
+            fields = 5
+        elif obstacle_size >= 6:
+            fields = 3
+        else:
+            fields = 2
+        return np.dtype(
+            {
+                "names": ["x", "y", "type", "u1", "u2", "photo_name"][:fields],
+                "formats": ["<u2", "<u2", "<u2", "<u2", "<u2", "V16"][:fields],
+                "offsets": [0, 2, 4, 6, 8, 12][:fields],
+                "itemsize": obstacle_size,
+            }
+        )
+
+    @staticmethod
+    def _parse_zones(data: memoryview, header: memoryview) -> list[Zone]:
         zone_pairs = RoborockMapDataParser._get_int16(header, 0x08)
-        zones = []
-        for zone_start in range(0, zone_pairs * 8, 8):
-            x0 = RoborockMapDataParser._get_int16(data, zone_start + 0)
-            y0 = RoborockMapDataParser._get_int16(data, zone_start + 2)
-            x1 = RoborockMapDataParser._get_int16(data, zone_start + 4)
-            y1 = RoborockMapDataParser._get_int16(data, zone_start + 6)
-            zones.append(Zone(x0, y0, x1, y1))
-        return zones
+        coordinates = np.frombuffer(data, dtype="<u2", count=zone_pairs * 4).reshape(-1, 4)
+        return list(itertools.starmap(Zone, coordinates.tolist()))
 
     @staticmethod
-    def _parse_path(block_start_position: int, header: bytes, raw: bytes) -> Path:
-        path_points = []
-        end_pos = RoborockMapDataParser._get_int32(header, 0x04)
-        point_length = RoborockMapDataParser._get_int32(header, 0x08)
-        point_size = RoborockMapDataParser._get_int32(header, 0x0C)
-        angle = RoborockMapDataParser._get_int32(header, 0x10)
+    def _parse_path(block_start_position: int, header: memoryview, raw: memoryview) -> Path:
+        end_pos, point_length, point_size, angle = RoborockMapDataParser.PATH_HEADER.unpack_from(header, 0)
         start_pos = block_start_position + 0x14
-        for pos in range(start_pos, start_pos + end_pos, 4):
-            x = RoborockMapDataParser._get_int16(raw, pos)
-            y = RoborockMapDataParser._get_int16(raw, pos + 2)
-            path_points.append(Point(x, y))
+        coordinates = np.frombuffer(raw, dtype="<u2", count=end_pos // 4 * 2, offset=start_pos).reshape(-1, 2)
+        path_points = list(itertools.starmap(Point, coordinates.tolist()))
         return Path(point_length, point_size, angle, [path_points])
 
     @staticmethod
-    def _parse_mop_path(path: Path, mask: bytes) -> Path:
-        mop_paths = []
+    def _parse_mop_path(path: Path, mask: memoryview) -> Path:
+        mop_paths: list[list[Point]] = []
         points_num = 0
+        mop_mask = np.frombuffer(mask, dtype=np.uint8).astype(bool)
         for each_path in path.path:
-            mop_path_points = []
-            for i, point in enumerate(each_path):
-                if mask[i]:
-                    mop_path_points.append(point)
-                    if (i + 1) < len(mask) and not mask[i + 1]:
-                        points_num += len(mop_path_points)
-                        mop_paths.append(mop_path_points)
-                        mop_path_points = []
-
-            points_num += len(mop_path_points)
-            mop_paths.append(mop_path_points)
+            path_mask = mop_mask[: len(each_path)]
+            edges = np.diff(np.concatenate(([False], path_mask, [False])).astype(np.int8))
+            starts = np.flatnonzero(edges == 1).tolist()
+            ends = np.flatnonzero(edges == -1).tolist()
+            mop_paths.extend(each_path[start:end] for start, end in zip(starts, ends))
+            # a segment is closed only when the mask goes back to 0, otherwise the last one stays open
+            if len(ends) == 0 or (ends[-1] < len(mop_mask) and not mop_mask[ends[-1]]):
+                mop_paths.append([])
+            points_num += int(path_mask.sum())
         return Path(points_num, path.point_size, path.angle, mop_paths)
 
     @staticmethod
-    def _parse_area(header: bytes, data: bytes) -> list[Area]:
+    def _parse_area(header: memoryview, data: memoryview) -> list[Area]:
         area_pairs = RoborockMapDataParser._get_int16(header, 0x08)
-        areas = []
-        for area_start in range(0, area_pairs * 16, 16):
-            x0 = RoborockMapDataParser._get_int16(data, area_start + 0)
-            y0 = RoborockMapDataParser._get_int16(data, area_start + 2)
-            x1 = RoborockMapDataParser._get_int16(data, area_start + 4)
-            y1 = RoborockMapDataParser._get_int16(data, area_start + 6)
-            x2 = RoborockMapDataParser._get_int16(data, area_start + 8)
-            y2 = RoborockMapDataParser._get_int16(data, area_start + 10)
-            x3 = RoborockMapDataParser._get_int16(data, area_start + 12)
-            y3 = RoborockMapDataParser._get_int16(data, area_start + 14)
-            areas.append(Area(x0, y0, x1, y1, x2, y2, x3, y3))
-        return areas
+        coordinates = np.frombuffer(data, dtype="<u2", count=area_pairs * 8).reshape(-1, 8)
+        return list(itertools.starmap(Area, coordinates.tolist()))
 
     @staticmethod
-    def _get_bytes(data: bytes, start_index: int, size: int) -> bytes:
+    def _get_view(data: memoryview, start_index: int, size: int) -> memoryview:
         return data[start_index : start_index + size]
 
     @staticmethod
-    def _get_int8(data: bytes, address: int) -> int:
-        return data[address] & 0xFF
+    def _get_bytes(data: memoryview, start_index: int, size: int) -> bytes:
+        return bytes(data[start_index : start_index + size])
 
     @staticmethod
-    def _get_int16(data: bytes, address: int) -> int:
-        return ((data[address + 0] << 0) & 0xFF) | ((data[address + 1] << 8) & 0xFFFF)
+    def _get_int16(data: memoryview, address: int) -> int:
+        return int.from_bytes(data[address : address + 2], "little")
 
     @staticmethod
-    def _get_int32(data: bytes, address: int) -> int:
-        return (
-            ((data[address + 0] << 0) & 0xFF)
-            | ((data[address + 1] << 8) & 0xFFFF)
-            | ((data[address + 2] << 16) & 0xFFFFFF)
-            | ((data[address + 3] << 24) & 0xFFFFFFFF)
-        )
+    def _get_int32(data: memoryview, address: int) -> int:
+        return int.from_bytes(data[address : address + 4], "little")